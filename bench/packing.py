@@ -0,0 +1,76 @@
+'''Measures how fast a backlog of queued notifications drains through the send runners
+
+The messenger APIs are replaced by a stub which sends at most --message-rate messages per second,
+the notifications are rendered by the clients' own send_push.
+'''
+import asyncio
+import click
+import time
+
+from bot.matrix_client import MatrixClient
+from bot.telegram_client import TelegramClient
+
+
+class RateLimitedSender:
+
+    def __init__(self, message_rate: float):
+        self.message_rate = message_rate
+        self.sent_messages = 0
+        self.is_sending = False
+
+    async def send(self, **kwargs):
+        self.is_sending = True
+        await asyncio.sleep(1 / self.message_rate)
+        self.sent_messages += 1
+        self.is_sending = False
+
+
+async def drain(client, sender: RateLimitedSender, notifications: int) -> float:
+    for index in range(notifications):
+        await client.send_push(
+            'pusher',
+            [f'Fix bug #{index} in the webhook handler', 'Update documentation'],
+            f'https://github.com/org/repo/compare/{index:07x}...{index + 1:07x}',
+            'main',
+            'https://github.com/org/repo/tree/main',
+            'org/repo',
+            'https://github.com/org/repo',
+            False,
+        )
+    started_at = time.monotonic()
+    send_task = asyncio.create_task(client.send_runner())
+    while not client.message_queue.empty() or len(client.pending_messages) > 0 or sender.is_sending:
+        await asyncio.sleep(0.001)
+    duration = time.monotonic() - started_at
+    send_task.cancel()
+    await send_task
+    return duration
+
+
+async def benchmark(notifications: int, message_rate: float, packing_threshold: int):
+    for packing_label, threshold in [('without packing', notifications + 1), (f'packing threshold {packing_threshold}', packing_threshold)]:
+        sender = RateLimitedSender(message_rate)
+        telegram = TelegramClient('-1', '-2', threshold, token='123456:benchmark')
+        telegram.bot.send_message = sender.send
+        duration = await drain(telegram, sender, notifications)
+        await telegram.bot.session.close()
+        print(f'Telegram {packing_label}: {notifications} notifications in {sender.sent_messages} messages, drained in {duration:.2f} s ({notifications / duration:.1f} notifications/s)')
+
+        sender = RateLimitedSender(message_rate)
+        matrix = MatrixClient('@bot:example.com', 'token', '!discussions:example.com', '!pushes:example.com', threshold, homeserver='https://matrix.example.com', store_path='')
+        matrix.client.room_send = sender.send
+        duration = await drain(matrix, sender, notifications)
+        await matrix.client.close()
+        print(f'Matrix {packing_label}: {notifications} notifications in {sender.sent_messages} messages, drained in {duration:.2f} s ({notifications / duration:.1f} notifications/s)')
+
+
+@click.command()
+@click.option('--notifications', type=int, default=200)
+@click.option('--message-rate', type=float, default=20)
+@click.option('--message-packing-threshold', type=int, default=3)
+def main(notifications: int, message_rate: float, message_packing_threshold: int):
+    asyncio.run(benchmark(notifications, message_rate, message_packing_threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import asyncio
+import calendar
+import json
+import logging
+import time
+import typing
+
+from .github_api import GitHubApi
+
+
+class DeliveryBackfill:
+    '''Requests redelivery of webhook deliveries that failed (e.g. while the bot was down)'''
+
+    def __init__(self, state_path: typing.Optional[str], max_age: float, concurrency: int):
+        self.logger = logging.getLogger('DeliveryBackfill')
+        self.state_path = state_path
+        self.max_age = max_age
+        self.concurrency = concurrency
+        state = self.load()
+        # newest scanned delivery ID per hook
+        self.high_water_marks: typing.Dict[str, int] = state.get('high_water_marks', {})
+        # deliveries per hook whose redelivery request failed and is retried in the next scan
+        self.failed_redeliveries: typing.Dict[str, typing.List[dict]] = state.get('failed_redeliveries', {})
+
+    def load(self) -> dict:
+        if self.state_path is None:
+            return {}
+        try:
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            self.logger.exception(f'Failed to load {self.state_path}, scanning from scratch')
+            return {}
+
+    def save(self):
+        if self.state_path is None:
+            return
+        try:
+            with open(self.state_path, 'w') as state_file:
+                json.dump({
+                    'high_water_marks': self.high_water_marks,
+                    'failed_redeliveries': self.failed_redeliveries,
+                }, state_file)
+        except OSError:
+            self.logger.exception(f'Failed to save {self.state_path}')
+
+    async def backfill(self, github: GitHubApi, hook_id: int, owner_or_org: str, repo: typing.Optional[str] = None):
+        key = f'{owner_or_org}/{repo}/{hook_id}' if repo is not None else f'{owner_or_org}/{hook_id}'
+        not_before = time.time() - self.max_age
+        deliveries = await github.hook_deliveries(
+            hook_id,
+            owner_or_org,
+            repo,
+            after_delivery_id=self.high_water_marks.get(key),
+            not_before=not_before,
+        )
+
+        # deliveries are ordered newest first, a GUID counts as delivered if any attempt succeeded
+        delivered_guids = set(
+            delivery['guid'] for delivery in deliveries if 200 <= delivery['status_code'] < 300
+        )
+        latest_attempts: typing.Dict[str, dict] = {}
+        for delivery in deliveries:
+            if delivery['guid'] not in delivered_guids and delivery['guid'] not in latest_attempts:
+                latest_attempts[delivery['guid']] = delivery
+        # failed redeliveries are not retried again to not loop forever
+        missed_deliveries = [
+            delivery for delivery in latest_attempts.values() if not delivery['redelivery']
+        ]
+        missed_guids = set(delivery['guid'] for delivery in missed_deliveries)
+        # only deliveries whose redelivery request failed are retried, accepted ones may not be recorded by GitHub yet
+        missed_deliveries += [
+            delivery for delivery in self.failed_redeliveries.get(key, [])
+            if delivery['guid'] not in delivered_guids and delivery['guid'] not in missed_guids and calendar.timegm(time.strptime(delivery['delivered_at'], '%Y-%m-%dT%H:%M:%SZ')) >= not_before
+        ]
+        if len(deliveries) == 0 and len(missed_deliveries) == 0 and key not in self.failed_redeliveries:
+            return
+        if len(missed_deliveries) > 0:
+            self.logger.warning(f'Found {len(missed_deliveries)} missed deliveries of {key}')
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def redeliver(delivery: dict) -> bool:
+            async with semaphore:
+                try:
+                    await github.redeliver(hook_id, delivery['id'], owner_or_org, repo)
+                    return True
+                except Exception:
+                    self.logger.exception(f'Failed to redeliver {delivery["guid"]} of {key}')
+                    return False
+
+        results = await asyncio.gather(*[redeliver(delivery) for delivery in missed_deliveries])
+        failed_redeliveries = [
+            {'id': delivery['id'], 'guid': delivery['guid'], 'delivered_at': delivery['delivered_at']}
+            for delivery, is_redelivered in zip(missed_deliveries, results) if not is_redelivered
+        ]
+        if len(failed_redeliveries) > 0:
+            self.failed_redeliveries[key] = failed_redeliveries
+        else:
+            self.failed_redeliveries.pop(key, None)
+        if len(deliveries) > 0:
+            self.high_water_marks[key] = max(delivery['id'] for delivery in deliveries)
+        self.save()
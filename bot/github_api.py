@@ -1,6 +1,9 @@
 import aiohttp
+import asyncio
+import calendar
 import links_from_header
 import logging
+import time
 import typing
 
 
@@ -115,6 +118,7 @@ class GitHubApi:
             self.logger.debug(f'POST {url} -> {response.status}')
             if response.status != 201:
                 raise UnexpectedResponseStatus('POST', url, response.status, 201, await response.text())
+            return (await response.json())['id']
 
     async def delete_hook(self, hook_id: int, owner_or_org: str, repo: typing.Optional[str] = None):
         self.logger.info(
@@ -130,3 +134,65 @@ class GitHubApi:
             self.logger.debug(f'DELETE {request_url} -> {response.status}')
             if response.status != 204:
                 raise UnexpectedResponseStatus('DELETE', request_url, response.status, 204, await response.text())
+
+    async def hook_deliveries(self, hook_id: int, owner_or_org: str, repo: typing.Optional[str] = None, after_delivery_id: typing.Optional[int] = None, not_before: typing.Optional[float] = None):
+        '''Retrieves deliveries (newest first) newer than after_delivery_id and not delivered before the not_before timestamp'''
+        self.logger.info(
+            f'Retrieving deliveries of hook {hook_id} for {owner_or_org}/{repo}...' if repo is not None else f'Retrieving deliveries of hook {hook_id} for {owner_or_org}...',
+        )
+        request_url = f'https://api.github.com/repos/{owner_or_org}/{repo}/hooks/{hook_id}/deliveries?per_page=100' if repo is not None else f'https://api.github.com/orgs/{owner_or_org}/hooks/{hook_id}/deliveries?per_page=100'
+        result = []
+        while request_url is not None:
+            deliveries, link_header = await self.rate_limited_request('GET', request_url, 200)
+            request_url = None
+            is_exhausted = False
+            for delivery in deliveries:
+                delivered_at = calendar.timegm(time.strptime(delivery['delivered_at'], '%Y-%m-%dT%H:%M:%SZ'))
+                if (after_delivery_id is not None and delivery['id'] <= after_delivery_id) or (not_before is not None and delivered_at < not_before):
+                    is_exhausted = True
+                    break
+                result.append(delivery)
+            if not is_exhausted and link_header is not None:
+                extracted_links = links_from_header.extract(link_header)
+                if 'next' in extracted_links:
+                    self.logger.debug('Retrieving next page...')
+                    request_url = extracted_links['next']
+        return result
+
+    async def redeliver(self, hook_id: int, delivery_id: int, owner_or_org: str, repo: typing.Optional[str] = None):
+        self.logger.info(
+            f'Redelivering {delivery_id} of hook {hook_id} for {owner_or_org}/{repo}...' if repo is not None else f'Redelivering {delivery_id} of hook {hook_id} for {owner_or_org}...',
+        )
+        request_url = f'https://api.github.com/repos/{owner_or_org}/{repo}/hooks/{hook_id}/deliveries/{delivery_id}/attempts' if repo is not None else f'https://api.github.com/orgs/{owner_or_org}/hooks/{hook_id}/deliveries/{delivery_id}/attempts'
+        await self.rate_limited_request('POST', request_url, 202)
+
+    async def rate_limited_request(self, method: str, request_url: str, expected_status: int) -> typing.Tuple[typing.Any, typing.Optional[str]]:
+        '''Sends a request and retries it once after the rate limit reset if it was rate limited, returns the JSON body and Link header'''
+        for is_retry in [False, True]:
+            self.logger.debug(f'{method} {request_url}...')
+            async with self.session.request(method, request_url, headers={
+                'Accept': 'application/vnd.github.v3+json',
+                'Authorization': f'token {self.access_token}',
+                'User-Agent': 'bot',
+            }) as response:
+                self.logger.debug(f'{method} {request_url} -> {response.status}')
+                timeout = self.rate_limit_timeout(response)
+                if response.status == expected_status:
+                    body = await response.json(content_type=None) if expected_status == 200 else None
+                    link_header = response.headers.get('Link')
+                elif timeout is None or is_retry:
+                    raise UnexpectedResponseStatus(method, request_url, response.status, expected_status, await response.text())
+            # sleep after the response has been released
+            if timeout is not None:
+                self.logger.warning(f'Rate limit exhausted, sleeping for {timeout} seconds...')
+                await asyncio.sleep(timeout)
+            if response.status == expected_status:
+                return body, link_header
+
+    def rate_limit_timeout(self, response: aiohttp.ClientResponse) -> typing.Optional[float]:
+        '''Returns the seconds until the rate limit resets if the response exhausted it'''
+        if 'Retry-After' in response.headers:
+            return int(response.headers['Retry-After'])
+        if response.headers.get('X-RateLimit-Remaining') == '0' and 'X-RateLimit-Reset' in response.headers:
+            return max(0, int(response.headers['X-RateLimit-Reset']) - time.time())
+        return None
@@ -4,9 +4,15 @@ import click
 import hashlib
 import hmac
 import logging
+import time
+import typing
 
-from .github_api import GitHubApi
+from .delivery_backfill import DeliveryBackfill
+from .github_api import UnexpectedResponseStatus
 from .matrix_client import MatrixClient
+from .organization import Organization, load_configurations
+from .request_guard import RequestGuard, client_address
+from . import tracing
 from .telegram_client import TelegramClient
 
 
@@ -22,13 +28,28 @@ class Bot:
                 self.handle,
             ),
         ])
-        self.update_hooks_event = asyncio.Event()
-        self.github = GitHubApi(
-            access_token=self.arguments['github_access_token'],
+        self.request_guard = RequestGuard(
+            rate=self.arguments['unauthorized_requests_rate'],
+            burst=self.arguments['unauthorized_requests_burst'],
+            ban_duration=self.arguments['unauthorized_requests_ban_duration'],
+        )
+        self.trusted_proxies = set(
+            proxy.strip() for proxy in self.arguments['trusted_proxies'].split(',') if len(proxy.strip()) > 0
+        )
+        self.tracer = tracing.Tracer(
+            export_path=self.arguments['tracing_export_path'],
+            sample_rate=self.arguments['tracing_sample_rate'],
+            slow_threshold=self.arguments['tracing_slow_threshold'],
+        )
+        self.backfill = DeliveryBackfill(
+            state_path=self.arguments['github_backfill_state_path'],
+            max_age=self.arguments['github_backfill_max_age'],
+            concurrency=self.arguments['github_backfill_concurrency'],
         )
         self.telegram = TelegramClient(
             chat_id_discussions=self.arguments['telegram_chat_id_discussions'],
             chat_id_pushes=self.arguments['telegram_chat_id_pushes'],
+            packing_threshold=self.arguments['message_packing_threshold'],
             token=self.arguments['telegram_bot_token'],
         )
         self.matrix = MatrixClient(
@@ -36,64 +57,148 @@ class Bot:
             access_token=self.arguments['matrix_access_token'],
             room_id_discussions=self.arguments['matrix_room_id_discussions'],
             room_id_pushes=self.arguments['matrix_room_id_pushes'],
+            packing_threshold=self.arguments['message_packing_threshold'],
             homeserver=self.arguments['matrix_homeserver'],
             user=self.arguments['matrix_user_id'],
             device_id=self.arguments['matrix_device_id'],
             store_path=self.arguments['matrix_store_path'],
         )
+        self.organizations = [
+            Organization(
+                name=configuration['organization'],
+                access_token=configuration['access_token'],
+                forkable_repositories=configuration['forkable_repositories'],
+                telegram=self.telegram.route(
+                    chat_id_discussions=configuration.get('telegram_chat_id_discussions', self.arguments['telegram_chat_id_discussions']),
+                    chat_id_pushes=configuration.get('telegram_chat_id_pushes', self.arguments['telegram_chat_id_pushes']),
+                ),
+                matrix=self.matrix.route(
+                    room_id_discussions=configuration.get('matrix_room_id_discussions', self.arguments['matrix_room_id_discussions']),
+                    room_id_pushes=configuration.get('matrix_room_id_pushes', self.arguments['matrix_room_id_pushes']),
+                ),
+            )
+            for configuration in load_configurations(self.arguments)
+        ]
 
     async def __aenter__(self):
-        await self.github.__aenter__()
+        for organization in self.organizations:
+            await organization.__aenter__()
         await self.telegram.__aenter__()
         await self.matrix.__aenter__()
-        self.update_hooks_task = asyncio.create_task(self.update_hooks_runner())
+        self.update_hooks_tasks = [
+            asyncio.create_task(self.update_hooks_runner(organization)) for organization in self.organizations
+        ]
+        self.backfill_tasks = [
+            asyncio.create_task(self.backfill_runner(organization)) for organization in self.organizations
+        ]
+        self.unauthorized_requests_summary_task = asyncio.create_task(
+            self.unauthorized_requests_summary_runner(),
+        )
         await self.telegram.send_startup()
         await self.matrix.send_startup()
-        await self.update_hooks()
+        for organization in self.organizations:
+            await self.update_hooks(organization)
         return self
 
     async def __aexit__(self, *args, **kwargs):
-        self.update_hooks_task.cancel()
-        await self.update_hooks_task
+        tasks = self.update_hooks_tasks + self.backfill_tasks + [self.unauthorized_requests_summary_task]
+        for task in tasks:
+            task.cancel()
+        for task, result in zip(tasks, await asyncio.gather(*tasks, return_exceptions=True)):
+            if isinstance(result, Exception):
+                self.logger.error(f'Task {task.get_coro().__name__} failed', exc_info=result)
         await self.telegram.__aexit__(*args, **kwargs)
         await self.matrix.__aexit__(*args, **kwargs)
-        await self.github.__aexit__(*args, **kwargs)
+        for organization in self.organizations:
+            await organization.__aexit__(*args, **kwargs)
+        self.tracer.close()
 
-    async def authenticate(self, request: aiohttp.web.Request):
+    async def authenticate(self, request: aiohttp.web.Request, remote: str) -> int:
+        '''Raises for unauthorized requests, returns when the body was read'''
+        if self.request_guard.is_banned(remote):
+            # drop flooding remotes before reading their body
+            raise aiohttp.web.HTTPTooManyRequests
+        if 'X-Hub-Signature-256' not in request.headers:
+            self.reject_unauthorized(remote)
+        body = await request.read()
+        body_read_at = time.time_ns()
         own_signature = 'sha256=' + hmac.new(
             key=self.arguments['github_webhook_secret'].encode(),
-            msg=await request.read(),
+            msg=body,
             digestmod=hashlib.sha256,
         ).hexdigest()
         sent_signature = request.headers['X-Hub-Signature-256']
-        if own_signature != sent_signature:
-            await self.telegram.send_unauthorized_request(request.remote)
-            await self.matrix.send_unauthorized_request(request.remote)
-            raise aiohttp.web.HTTPForbidden
+        if not hmac.compare_digest(own_signature.encode(), sent_signature.encode()):
+            self.reject_unauthorized(remote)
+        self.request_guard.record_authorized(remote)
+        return body_read_at
+
+    def reject_unauthorized(self, remote: str):
+        if self.request_guard.record_unauthorized(remote):
+            raise aiohttp.web.HTTPTooManyRequests
+        raise aiohttp.web.HTTPForbidden
 
     async def handle(self, request: aiohttp.web.Request):
-        await self.authenticate(request)
-        event = request.headers['X-Github-Event']
-        payload = await request.json()
+        received_at = time.time_ns()
+        remote = client_address(
+            request.remote,
+            request.headers.get('X-Forwarded-For'),
+            self.trusted_proxies,
+        )
+        # rejected requests stay cheap, traces only start for authorized ones
+        body_read_at = await self.authenticate(request, remote)
+        authenticated_at = time.time_ns()
+        with self.tracer.trace(
+            'webhook',
+            request.headers.get('X-GitHub-Delivery'),
+            start_time=received_at,
+            delivery=request.headers.get('X-GitHub-Delivery', ''),
+            event=request.headers.get('X-GitHub-Event', ''),
+            remote=remote,
+        ):
+            tracing.record_span('receive', received_at, body_read_at)
+            tracing.record_span('auth', body_read_at, authenticated_at)
+            event = request.headers['X-Github-Event']
+            with tracing.span('decode'):
+                payload = await request.json()
+            organization = self.resolve_organization(payload)
+            if organization is None:
+                # let GitHub record a failed delivery s.t. the backfill redelivers it once the fork is known
+                self.logger.warning(f'Rejecting {event} event of unknown organization')
+                raise aiohttp.web.HTTPServiceUnavailable
+            tracing.set_attribute('organization', organization.name)
+            with tracing.span('render'):
+                return await self.dispatch(organization, event, payload)
+
+    def resolve_organization(self, payload: dict) -> typing.Optional[Organization]:
+        for organization in self.organizations:
+            if organization.owns(payload):
+                return organization
+        if len(self.organizations) == 1:
+            # e.g. events of new forks which have not been reconciled yet
+            return self.organizations[0]
+        return None
+
+    async def dispatch(self, organization: Organization, event: str, payload: dict):
         if event == 'ping':
-            return await self.handle_ping(payload)
+            return await self.handle_ping(organization, payload)
         elif event == 'push':
-            return await self.handle_push(payload)
+            return await self.handle_push(organization, payload)
         elif event == 'issues' or event == 'pull_request':
-            return await self.handle_issue_or_pull_request(payload)
+            return await self.handle_issue_or_pull_request(organization, payload)
         elif event == 'issue_comment' or event == 'pull_request_review_comment':
-            return await self.handle_issue_or_pull_request_comment(payload)
+            return await self.handle_issue_or_pull_request_comment(organization, payload)
         elif event == 'pull_request_review':
-            return await self.handle_pull_request_review(payload)
+            return await self.handle_pull_request_review(organization, payload)
         elif event == 'fork':
-            return await self.handle_fork(payload)
+            return await self.handle_fork(organization, payload)
         # silently ignore unimplemented events
-        raise aiohttp.web.HTTPOk
+        return aiohttp.web.Response()
 
-    async def handle_ping(self, payload: dict):
+    async def handle_ping(self, organization: Organization, payload: dict):
         return aiohttp.web.Response()
 
-    async def handle_push(self, payload: dict):
+    async def handle_push(self, organization: Organization, payload: dict):
         if payload['deleted'] == True:
             # ignore deleted branch notifications
             return aiohttp.web.Response()
@@ -106,19 +211,19 @@ class Bot:
         branch_url = f'https://github.com/{repository}/tree/{branch}'
         repository_url = f'https://github.com/{repository}'
         is_forced = payload['forced']
-        await self.telegram.send_push(pusher, commit_messages, commits_url, branch, branch_url, repository, repository_url, is_forced)
-        await self.matrix.send_push(pusher, commit_messages, commits_url, branch, branch_url, repository, repository_url, is_forced)
+        await organization.telegram.send_push(pusher, commit_messages, commits_url, branch, branch_url, repository, repository_url, is_forced)
+        await organization.matrix.send_push(pusher, commit_messages, commits_url, branch, branch_url, repository, repository_url, is_forced)
         return aiohttp.web.Response()
 
-    async def handle_issue_or_pull_request(self, payload: dict):
+    async def handle_issue_or_pull_request(self, organization: Organization, payload: dict):
         if payload['action'] == 'converted_to_draft':
             sender = payload['sender']['login']
             repository = payload['repository']['full_name']
             number = payload['pull_request']['number']
             title = payload['pull_request']['title']
             url = payload['pull_request']['html_url']
-            await self.telegram.send_pull_request_draft(sender, True, repository, number, title, url)
-            await self.matrix.send_pull_request_draft(sender, True, repository, number, title, url)
+            await organization.telegram.send_pull_request_draft(sender, True, repository, number, title, url)
+            await organization.matrix.send_pull_request_draft(sender, True, repository, number, title, url)
             return aiohttp.web.Response()
         if payload['action'] == 'ready_for_review':
             sender = payload['sender']['login']
@@ -126,8 +231,8 @@ class Bot:
             number = payload['pull_request']['number']
             title = payload['pull_request']['title']
             url = payload['pull_request']['html_url']
-            await self.telegram.send_pull_request_draft(sender, False, repository, number, title, url)
-            await self.matrix.send_pull_request_draft(sender, False, repository, number, title, url)
+            await organization.telegram.send_pull_request_draft(sender, False, repository, number, title, url)
+            await organization.matrix.send_pull_request_draft(sender, False, repository, number, title, url)
             return aiohttp.web.Response()
         if payload['action'] not in ['opened', 'closed', 'reopened']:
             return aiohttp.web.Response()
@@ -139,11 +244,11 @@ class Bot:
         number = payload['pull_request']['number'] if 'pull_request' in payload else payload['issue']['number']
         title = payload['pull_request']['title'] if 'pull_request' in payload else payload['issue']['title']
         url = payload['pull_request']['html_url'] if 'pull_request' in payload else payload['issue']['html_url']
-        await self.telegram.send_issue_or_pull_request(sender, type, action, repository, number, title, url)
-        await self.matrix.send_issue_or_pull_request(sender, type, action, repository, number, title, url)
+        await organization.telegram.send_issue_or_pull_request(sender, type, action, repository, number, title, url)
+        await organization.matrix.send_issue_or_pull_request(sender, type, action, repository, number, title, url)
         return aiohttp.web.Response()
 
-    async def handle_issue_or_pull_request_comment(self, payload: dict):
+    async def handle_issue_or_pull_request_comment(self, organization: Organization, payload: dict):
         if payload['action'] != 'created':
             return aiohttp.web.Response()
         commenter = payload['comment']['user']['login']
@@ -154,11 +259,11 @@ class Bot:
         body = payload['comment']['body']
         comment_url = payload['comment']['html_url']
         url = payload['pull_request']['html_url'] if 'pull_request' in payload else payload['issue']['html_url']
-        await self.telegram.send_issue_or_pull_request_comment(commenter, type, repository, number, title, body, comment_url, url)
-        await self.matrix.send_issue_or_pull_request_comment(commenter, type, repository, number, title, body, comment_url, url)
+        await organization.telegram.send_issue_or_pull_request_comment(commenter, type, repository, number, title, body, comment_url, url)
+        await organization.matrix.send_issue_or_pull_request_comment(commenter, type, repository, number, title, body, comment_url, url)
         return aiohttp.web.Response()
 
-    async def handle_pull_request_review(self, payload: dict):
+    async def handle_pull_request_review(self, organization: Organization, payload: dict):
         body = payload['review']['body']
         state = payload['review']['state']
         if payload['review']['state'] == 'changes_requested':
@@ -176,66 +281,143 @@ class Bot:
         title = payload['pull_request']['title']
         comment_url = payload['review']['html_url']
         url = payload['pull_request']['html_url'] if 'pull_request' in payload else payload['issue']['html_url']
-        await self.telegram.send_pull_request_review(sender, state, repository, number, title, body, comment_url, url)
-        await self.matrix.send_pull_request_review(sender, state, repository, number, title, body, comment_url, url)
+        await organization.telegram.send_pull_request_review(sender, state, repository, number, title, body, comment_url, url)
+        await organization.matrix.send_pull_request_review(sender, state, repository, number, title, body, comment_url, url)
         return aiohttp.web.Response()
 
-    async def handle_fork(self, payload: dict):
-        await self.update_hooks()
+    async def handle_fork(self, organization: Organization, payload: dict):
+        await self.update_hooks(organization)
         return aiohttp.web.Response()
 
-    async def update_hooks(self):
-        self.update_hooks_event.set()
+    async def update_hooks(self, organization: Organization):
+        organization.update_hooks_event.set()
 
-    async def update_hooks_runner(self):
+    async def update_hooks_runner(self, organization: Organization):
         try:
             while True:
-                await self.update_hooks_event.wait()
-                self.update_hooks_event.clear()
-                required_events = [
-                    'push',
-                    'issues',
-                    'pull_request',
-                    'issue_comment',
-                    'pull_request_review_comment',
-                    'pull_request_review',
-                    'fork',
-                ]
+                await organization.update_hooks_event.wait()
+                organization.update_hooks_event.clear()
+                try:
+                    await self.update_hooks_of(organization)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self.logger.exception(f'Failed to update hooks of {organization.name}')
+        except asyncio.CancelledError:
+            pass
+
+    async def update_hooks_of(self, organization: Organization):
+        required_events = [
+            'push',
+            'issues',
+            'pull_request',
+            'issue_comment',
+            'pull_request_review_comment',
+            'pull_request_review',
+            'fork',
+        ]
+        configured_organizations = set(
+            configured_organization.name.lower() for configured_organization in self.organizations
+        )
+        managed_hooks = []
+        forks = set()
+        create_needed = True
+        for hook_id, hook_url, hook_events in await organization.github.hooks(organization.name):
+            if hook_url == self.arguments['github_webhook_url']:
+                create_needed = False
+                if set(hook_events) != set(required_events):
+                    await organization.github.delete_hook(hook_id, organization.name)
+                    create_needed = True
+                else:
+                    managed_hooks.append((hook_id, organization.name, None))
+        if create_needed:
+            await organization.telegram.send_create_webhook_of_organization(organization.name)
+            await organization.matrix.send_create_webhook_of_organization(organization.name)
+            hook_id = await organization.github.create_hook(
+                self.arguments['github_webhook_url'],
+                required_events,
+                self.arguments['github_webhook_secret'],
+                organization.name,
+            )
+            managed_hooks.append((hook_id, organization.name, None))
+        for repo in organization.forkable_repositories:
+            for fork_owner, fork_repo in await organization.github.forks(organization.name, repo):
+                if fork_owner.lower() in configured_organizations:
+                    # events of repositories in configured organizations are already sent by their organization hook
+                    self.logger.info(f'Skipping fork {fork_owner}/{fork_repo} of configured organization')
+                    await self.delete_duplicate_hooks(organization, fork_owner, fork_repo)
+                    continue
+                forks.add(f'{fork_owner}/{fork_repo}'.lower())
+                # resolve events of new forks before this pass is complete
+                organization.forks.add(f'{fork_owner}/{fork_repo}'.lower())
                 create_needed = True
-                for hook_id, hook_url, hook_events in await self.github.hooks(self.arguments['github_organization']):
+                for hook_id, hook_url, hook_events in await organization.github.hooks(fork_owner, fork_repo):
                     if hook_url == self.arguments['github_webhook_url']:
                         create_needed = False
                         if set(hook_events) != set(required_events):
-                            await self.github.delete_hook(hook_id, self.arguments['github_organization'])
+                            await organization.github.delete_hook(hook_id, fork_owner, fork_repo)
                             create_needed = True
+                        else:
+                            managed_hooks.append((hook_id, fork_owner, fork_repo))
                 if create_needed:
-                    await self.telegram.send_create_webhook_of_organization(self.arguments['github_organization'])
-                    await self.matrix.send_create_webhook_of_organization(self.arguments['github_organization'])
-                    await self.github.create_hook(
+                    await organization.telegram.send_create_webhook_of_repository(fork_owner, fork_repo)
+                    await organization.matrix.send_create_webhook_of_repository(fork_owner, fork_repo)
+                    hook_id = await organization.github.create_hook(
                         self.arguments['github_webhook_url'],
                         required_events,
                         self.arguments['github_webhook_secret'],
-                        self.arguments['github_organization'],
+                        fork_owner,
+                        fork_repo,
+                    )
+                    managed_hooks.append((hook_id, fork_owner, fork_repo))
+        organization.managed_hooks = managed_hooks
+        organization.forks = forks
+        # backfill deliveries missed while the bot was down (incremental after the first time)
+        organization.backfill_event.set()
+
+    async def delete_duplicate_hooks(self, organization: Organization, fork_owner: str, fork_repo: str):
+        '''Deletes repository hooks which were created before the fork's owner was configured as organization'''
+        try:
+            for hook_id, hook_url, hook_events in await organization.github.hooks(fork_owner, fork_repo):
+                if hook_url == self.arguments['github_webhook_url']:
+                    await organization.github.delete_hook(hook_id, fork_owner, fork_repo)
+        except UnexpectedResponseStatus:
+            self.logger.exception(f'Failed to delete duplicate hooks of {fork_owner}/{fork_repo}')
+
+    async def backfill_runner(self, organization: Organization):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        organization.backfill_event.wait(),
+                        timeout=self.arguments['github_backfill_interval'],
                     )
-                for repo in self.arguments['github_forkable_repositories'].split(','):
-                    for fork_owner, fork_repo in await self.github.forks(self.arguments['github_organization'], repo):
-                        create_needed = True
-                        for hook_id, hook_url, hook_events in await self.github.hooks(fork_owner, fork_repo):
-                            if hook_url == self.arguments['github_webhook_url']:
-                                create_needed = False
-                                if set(hook_events) != set(required_events):
-                                    await self.github.delete_hook(hook_id, fork_owner, fork_repo)
-                                    create_needed = True
-                        if create_needed:
-                            await self.telegram.send_create_webhook_of_repository(fork_owner, fork_repo)
-                            await self.matrix.send_create_webhook_of_repository(fork_owner, fork_repo)
-                            await self.github.create_hook(
-                                self.arguments['github_webhook_url'],
-                                required_events,
-                                self.arguments['github_webhook_secret'],
-                                fork_owner,
-                                fork_repo,
-                            )
+                except asyncio.TimeoutError:
+                    pass
+                organization.backfill_event.clear()
+                for hook_id, owner_or_org, repo in organization.managed_hooks:
+                    try:
+                        await self.backfill.backfill(organization.github, hook_id, owner_or_org, repo)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        self.logger.exception(f'Failed to backfill deliveries of hook {hook_id}')
+        except asyncio.CancelledError:
+            pass
+
+    async def unauthorized_requests_summary_runner(self):
+        interval = self.arguments['unauthorized_requests_summary_interval']
+        period = f'{interval // 60} min' if interval % 60 == 0 else f'{interval} s'
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                rejected_requests, remotes = self.request_guard.pop_summary()
+                if rejected_requests == 0:
+                    continue
+                self.logger.warning(
+                    f'{rejected_requests} rejected requests from {len(remotes)} IPs in the last {period}')
+                await self.telegram.send_unauthorized_requests_summary(rejected_requests, remotes, period)
+                await self.matrix.send_unauthorized_requests_summary(rejected_requests, remotes, period)
         except asyncio.CancelledError:
             pass
 
@@ -267,10 +449,15 @@ async def async_main(arguments):
 @click.option('--github-webhook-host', required=True, envvar='GITHUB_WEBHOOK_HOST')
 @click.option('--github-webhook-port', type=int, required=True, envvar='GITHUB_WEBHOOK_PORT')
 @click.option('--github-webhook-secret', required=True, envvar='GITHUB_WEBHOOK_SECRET')
-@click.option('--github-access-token', required=True, envvar='GITHUB_ACCESS_TOKEN')
-@click.option('--github-organization', required=True, envvar='GITHUB_ORGANIZATION')
-@click.option('--github-forkable-repositories', required=True, envvar='GITHUB_FORKABLE_REPOSITORIES')
+@click.option('--github-access-token', envvar='GITHUB_ACCESS_TOKEN')
+@click.option('--github-organization', envvar='GITHUB_ORGANIZATION')
+@click.option('--github-forkable-repositories', envvar='GITHUB_FORKABLE_REPOSITORIES')
+@click.option('--github-organizations-config', type=click.Path(exists=True, dir_okay=False), envvar='GITHUB_ORGANIZATIONS_CONFIG')
 @click.option('--github-webhook-url', required=True, envvar='GITHUB_WEBHOOK_URL')
+@click.option('--github-backfill-state-path', default=None, envvar='GITHUB_BACKFILL_STATE_PATH')
+@click.option('--github-backfill-interval', type=click.FloatRange(min=1), default=3600, envvar='GITHUB_BACKFILL_INTERVAL')
+@click.option('--github-backfill-max-age', type=click.FloatRange(min=0), default=24*60*60, envvar='GITHUB_BACKFILL_MAX_AGE')
+@click.option('--github-backfill-concurrency', type=click.IntRange(min=1), default=4, envvar='GITHUB_BACKFILL_CONCURRENCY')
 @click.option('--telegram-bot-token', required=True, envvar='TELEGRAM_BOT_TOKEN')
 @click.option('--telegram-chat-id-discussions', required=True, envvar='TELEGRAM_CHAT_ID_DISCUSSIONS')
 @click.option('--telegram-chat-id-pushes', required=True, envvar='TELEGRAM_CHAT_ID_PUSHES')
@@ -281,8 +468,30 @@ async def async_main(arguments):
 @click.option('--matrix-store-path', required=True, envvar='MATRIX_STORE_PATH')
 @click.option('--matrix-room-id-discussions', required=True, envvar='MATRIX_ROOM_ID_DISCUSSIONS')
 @click.option('--matrix-room-id-pushes', required=True, envvar='MATRIX_ROOM_ID_PUSHES')
+@click.option('--trusted-proxies', default='', envvar='TRUSTED_PROXIES')
+@click.option('--unauthorized-requests-rate', type=float, default=1/60, envvar='UNAUTHORIZED_REQUESTS_RATE')
+@click.option('--unauthorized-requests-burst', type=float, default=5, envvar='UNAUTHORIZED_REQUESTS_BURST')
+@click.option('--unauthorized-requests-ban-duration', type=float, default=0, envvar='UNAUTHORIZED_REQUESTS_BAN_DURATION')
+@click.option('--unauthorized-requests-summary-interval', type=click.IntRange(min=1), default=300, envvar='UNAUTHORIZED_REQUESTS_SUMMARY_INTERVAL')
+@click.option('--message-packing-threshold', type=click.IntRange(min=2), default=3, envvar='MESSAGE_PACKING_THRESHOLD')
+@click.option('--tracing-export-path', default=None, envvar='TRACING_EXPORT_PATH')
+@click.option('--tracing-sample-rate', type=click.FloatRange(min=0, max=1), default=0.01, envvar='TRACING_SAMPLE_RATE')
+@click.option('--tracing-slow-threshold', type=float, default=10, envvar='TRACING_SLOW_THRESHOLD')
 @click.option('--logging-level', required=True, type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']), envvar='LOGGING_LEVEL')
 def main(**arguments):
+    for option in ['github_access_token', 'github_organization', 'github_forkable_repositories']:
+        if arguments['github_organizations_config'] is None and arguments[option] is None:
+            raise click.UsageError(
+                f'Missing option \'--{option.replace("_", "-")}\' (required without \'--github-organizations-config\')',
+            )
+        if arguments['github_organizations_config'] is not None and arguments[option] is not None:
+            raise click.UsageError(
+                f'Option \'--{option.replace("_", "-")}\' cannot be combined with \'--github-organizations-config\'',
+            )
+    try:
+        load_configurations(arguments)
+    except (OSError, ValueError) as error:
+        raise click.BadParameter(str(error), param_hint='\'--github-organizations-config\'')
     logging.basicConfig(
         level=arguments['logging_level'],
         format='%(asctime)s  %(name)-20s  %(levelname)-8s  %(message)s',
@@ -1,17 +1,27 @@
+import aiohttp
 import asyncio
+import collections
+import copy
+import json
 import logging
 import nio
+import traceback
 import typing
 
+from . import message_packing, tracing
+
 
 class MatrixClient:
 
-    def __init__(self, user_id: str, access_token: str, room_id_discussions: str, room_id_pushes: str, *args, **kwargs):
+    def __init__(self, user_id: str, access_token: str, room_id_discussions: str, room_id_pushes: str, packing_threshold: int, *args, **kwargs):
         self.client = nio.AsyncClient(*args, **kwargs)
         self.client.restore_login(user_id, self.client.device_id, access_token)
         self.logger = logging.getLogger('MatrixClient')
         self.room_id_discussions = room_id_discussions
         self.room_id_pushes = room_id_pushes
+        self.packing_threshold = packing_threshold
+        self.message_queue = asyncio.Queue()
+        self.pending_messages = collections.deque()
 
     async def __aenter__(self) -> 'MatrixClient':
         self.logger.debug('Starting sync task...')
@@ -20,10 +30,23 @@ class MatrixClient:
         self.logger.debug('Waiting for first sync...')
         await wait_for_first_sync
         self.logger.debug('First sync finished')
+        self.send_task = asyncio.create_task(self.send_runner())
 
         return self
 
     async def __aexit__(self, *args, **kwargs):
+        self.send_task.cancel()
+        try:
+            await self.send_task
+        except asyncio.CancelledError:
+            pass
+
+        self.take_queued_messages()
+        if len(self.pending_messages) > 0:
+            self.logger.error(f'{len(self.pending_messages)} unsent messages:')
+        for room_id, message, _, _ in self.pending_messages:
+            self.logger.error(f'Message \'{message}\' to room {room_id}')
+
         self.sync_task.cancel()
         try:
             await self.sync_task
@@ -32,31 +55,100 @@ class MatrixClient:
 
         await self.client.close()
 
+    def route(self, room_id_discussions: str, room_id_pushes: str) -> 'MatrixClient':
+        '''Creates a client sharing the connection which sends to other rooms'''
+        routed = copy.copy(self)
+        routed.room_id_discussions = room_id_discussions
+        routed.room_id_pushes = room_id_pushes
+        return routed
+
+    def take_queued_messages(self):
+        while True:
+            try:
+                self.pending_messages.append(self.message_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def send_runner(self):
+        try:
+            while True:
+                if len(self.pending_messages) == 0:
+                    self.pending_messages.append(await self.message_queue.get())
+                self.take_queued_messages()
+                room_id = self.pending_messages[0][0]
+                # join backlogged messages of a room, their JSON encoded length is budgeted to 48 KiB, leaving 16 KiB of the
+                # 64 KiB event limit for the remaining content and the event envelope
+                max_length = 48 * 1024
+                room = self.client.rooms.get(room_id)
+                if room is None or room.encrypted:
+                    # Megolm base64 encodes the encrypted JSON content, i.e. it grows by 4/3 (unknown rooms may be encrypted, too)
+                    max_length = max_length * 3 // 4
+                batch = message_packing.take_batch(
+                    self.pending_messages,
+                    threshold=self.packing_threshold,
+                    max_length=max_length,
+                    separator_length=self.encoded_length('\n\n') + self.encoded_length('<br /><br />'),
+                    destination_of=lambda item: (item[0], None),
+                    length_of=lambda item: self.encoded_length(item[1]) + self.encoded_length(item[2]),
+                )
+                message = '\n\n'.join(message for _, message, _, _ in batch)
+                formatted_message = '<br /><br />'.join(formatted_message for _, _, formatted_message, _ in batch)
+                with tracing.attach_all([detached_trace for _, _, _, detached_trace in batch], 'send matrix', room_id=room_id, packed_messages=len(batch)):
+                    back_off_timeout = 6
+                    attempts = 0
+                    while True:
+                        attempts += 1
+                        tracing.set_attribute('attempts', attempts)
+                        retry_after: typing.Optional[float] = None
+                        try:
+                            response = await self.client.room_send(
+                                room_id=room_id,
+                                message_type='m.room.message',
+                                content={
+                                    'msgtype': 'm.text',
+                                    'body': message,
+                                    'format': 'org.matrix.custom.html',
+                                    'formatted_body': formatted_message,
+                                },
+                                ignore_unverified_devices=True,
+                            )
+                        except asyncio.CancelledError:
+                            return
+                        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                            self.logger.error(f'Failed to send message \'{message}\' to room {room_id}')
+                            traceback.print_exc()
+                        except Exception as error:
+                            # e.g. LocalProtocolError if the bot is not in the room, retrying would block all following messages forever
+                            self.logger.exception(f'Dropping message \'{message}\' to room {room_id}')
+                            tracing.set_attribute('dropped', type(error).__name__)
+                            break
+                        else:
+                            if not isinstance(response, nio.RoomSendError):
+                                break
+                            if response.status_code != 'M_LIMIT_EXCEEDED':
+                                # e.g. M_FORBIDDEN or M_TOO_LARGE, the homeserver will reject the message again
+                                self.logger.error(f'Dropping message \'{message}\' to room {room_id}: {response}')
+                                tracing.set_attribute('dropped', str(response.status_code))
+                                break
+                            self.logger.error(f'Rate limited while sending message \'{message}\' to room {room_id}: {response}')
+                            if response.retry_after_ms is not None:
+                                retry_after = response.retry_after_ms / 1000
+                        sleep_timeout = retry_after if retry_after is not None else back_off_timeout
+                        self.logger.error(f'Sleeping for {sleep_timeout} seconds...')
+                        await asyncio.sleep(sleep_timeout)
+                        if back_off_timeout <= 120:
+                            back_off_timeout *= 2
+                        self.logger.error(f'Retrying...')
+        except asyncio.CancelledError:
+            pass
+
     async def send_to_discussions(self, message: str, formatted_message: str, **kwargs):
-        await self.client.room_send(
-            room_id=self.room_id_discussions,
-            message_type='m.room.message',
-            content={
-                'msgtype': 'm.text',
-                'body': message,
-                'format': 'org.matrix.custom.html',
-                'formatted_body': formatted_message,
-            },
-            ignore_unverified_devices=True,
-        )
+        with tracing.span('enqueue matrix', room_id=self.room_id_discussions):
+            await self.message_queue.put((self.room_id_discussions, message, formatted_message, tracing.detach()))
 
     async def send_to_pushes(self, message: str, formatted_message: str, **kwargs):
-        await self.client.room_send(
-            room_id=self.room_id_pushes,
-            message_type='m.room.message',
-            content={
-                'msgtype': 'm.text',
-                'body': message,
-                'format': 'org.matrix.custom.html',
-                'formatted_body': formatted_message,
-            },
-            ignore_unverified_devices=True,
-        )
+        with tracing.span('enqueue matrix', room_id=self.room_id_pushes):
+            await self.message_queue.put((self.room_id_pushes, message, formatted_message, tracing.detach()))
 
     async def send_startup(self):
         await self.send_to_discussions(
@@ -68,10 +160,15 @@ class MatrixClient:
             '\U0001f92b Online again',
         )
 
-    async def send_unauthorized_request(self, remote: str):
+    async def send_unauthorized_requests_summary(self, rejected_requests: int, remotes: typing.List[str], period: str):
+        escaped_remotes_markdown = ', '.join([f'`{remote}`' for remote in remotes[:10]])
+        escaped_remotes_html = ', '.join([f'<code>{self.escape(remote)}</code>' for remote in remotes[:10]])
+        if len(remotes) > 10:
+            escaped_remotes_markdown += f', ... {len(remotes) - 10} more'
+            escaped_remotes_html += f', ... {len(remotes) - 10} more'
         await self.send_to_pushes(
-            f'\U000026a0 Unauthorized request from `{self.escape(remote)}`',
-            f'\U000026a0 Unauthorized request from <code>{self.escape(remote)}</code>',
+            f'\U000026a0 {rejected_requests} rejected requests from {len(remotes)} IPs in the last {period}: {escaped_remotes_markdown}',
+            f'\U000026a0 {rejected_requests} rejected requests from {len(remotes)} IPs in the last {period}: {escaped_remotes_html}',
         )
 
     async def send_create_webhook_of_repository(self, fork_owner: str, fork_repo: str):
@@ -137,5 +234,9 @@ class MatrixClient:
             f'<code>@{self.escape(sender)}</code> marked pull request <code>{self.escape(title)}</code> (<a href="{url}">{self.escape(repository)}#{number}</a>) as {action}',
         )
 
+    def encoded_length(self, text: str) -> int:
+        '''Length of the text in the event content as nio JSON encodes it (e.g. 12 bytes for an emoji, 2 bytes for a newline)'''
+        return len(json.dumps(text)) - len('""')
+
     def escape(self, message: str):
         return message.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace('\'', '&#x27;')
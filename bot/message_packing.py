@@ -0,0 +1,43 @@
+import collections
+import typing
+
+
+Item = typing.TypeVar('Item')
+
+
+def take_batch(
+    pending: typing.Deque[Item],
+    threshold: int,
+    max_length: int,
+    separator_length: int,
+    destination_of: typing.Callable[[Item], typing.Tuple[typing.Hashable, typing.Hashable]],
+    length_of: typing.Callable[[Item], int],
+) -> typing.List[Item]:
+    '''Takes the next pending item and, if its destination is backlogged, the following items of the same destination which fit into one message
+
+    destination_of returns the destination and the send options of an item, only items with equal options are joined.
+    Items of other destinations keep their order in pending.
+    '''
+    first = pending.popleft()
+    destination, options = destination_of(first)
+    backlog = 1 + sum(1 for item in pending if destination_of(item)[0] == destination)
+    if backlog < threshold:
+        return [first]
+
+    batch = [first]
+    length = length_of(first)
+    remaining = collections.deque()
+    is_packing = True
+    while len(pending) > 0:
+        item = pending.popleft()
+        item_destination, item_options = destination_of(item)
+        if is_packing and item_destination == destination:
+            if item_options == options and length + separator_length + length_of(item) <= max_length:
+                batch.append(item)
+                length += separator_length + length_of(item)
+                continue
+            # keep the order of the destination's messages
+            is_packing = False
+        remaining.append(item)
+    pending.extend(remaining)
+    return batch
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import typing
+
+from .github_api import GitHubApi
+from .matrix_client import MatrixClient
+from .telegram_client import TelegramClient
+
+
+class Organization:
+    '''Everything the bot manages for one GitHub organization: its API budget, hooks and message routing'''
+
+    def __init__(self, name: str, access_token: str, forkable_repositories: typing.List[str], telegram: TelegramClient, matrix: MatrixClient):
+        self.name = name
+        self.github = GitHubApi(access_token=access_token)
+        self.forkable_repositories = forkable_repositories
+        self.telegram = telegram
+        self.matrix = matrix
+        self.update_hooks_event = asyncio.Event()
+        self.backfill_event = asyncio.Event()
+        self.managed_hooks: typing.List[typing.Tuple[int, str, typing.Optional[str]]] = []
+        # lower case full names of all forks (recursively) of the forkable repositories
+        self.forks: typing.Set[str] = set()
+
+    async def __aenter__(self) -> 'Organization':
+        await self.github.__aenter__()
+        return self
+
+    async def __aexit__(self, *args, **kwargs):
+        await self.github.__aexit__(*args, **kwargs)
+
+    def owns(self, payload: dict) -> bool:
+        '''Checks whether a webhook payload originates from this organization or one of its managed forks'''
+        if 'organization' in payload and payload['organization']['login'].lower() == self.name.lower():
+            return True
+        if 'repository' in payload:
+            if payload['repository']['owner']['login'].lower() == self.name.lower():
+                return True
+            if payload['repository']['full_name'].lower() in self.forks:
+                return True
+        return False
+
+
+def load_configurations(arguments: dict) -> typing.List[dict]:
+    '''Loads the organization configurations from the JSON file or falls back to the single organization arguments'''
+    if arguments['github_organizations_config'] is None:
+        return [{
+            'organization': arguments['github_organization'],
+            'access_token': arguments['github_access_token'],
+            'forkable_repositories': arguments['github_forkable_repositories'].split(','),
+        }]
+    with open(arguments['github_organizations_config']) as config_file:
+        configurations = json.load(config_file)
+    if not isinstance(configurations, list) or len(configurations) == 0:
+        raise ValueError('Organization configuration must be a non-empty list')
+    for index, configuration in enumerate(configurations):
+        name = configuration.get('organization', f'#{index}') if isinstance(configuration, dict) else f'#{index}'
+        if not isinstance(configuration, dict):
+            raise ValueError(f'Organization configuration {name} must be an object')
+        for key in ['organization', 'access_token']:
+            if not isinstance(configuration.get(key), str) or len(configuration[key]) == 0:
+                raise ValueError(f'Organization configuration {name} needs a non-empty string {key}')
+        forkable_repositories = configuration.get('forkable_repositories')
+        if not isinstance(forkable_repositories, list) or not all(isinstance(repo, str) for repo in forkable_repositories):
+            raise ValueError(f'Organization configuration {name} needs forkable_repositories as list of strings (e.g. ["repo", "other"])')
+        for key in ['telegram_chat_id_discussions', 'telegram_chat_id_pushes']:
+            if key in configuration and not isinstance(configuration[key], (str, int)):
+                raise ValueError(f'Organization configuration {name} needs {key} as string or number')
+        for key in ['matrix_room_id_discussions', 'matrix_room_id_pushes']:
+            if key in configuration and not isinstance(configuration[key], str):
+                raise ValueError(f'Organization configuration {name} needs {key} as string')
+    return configurations
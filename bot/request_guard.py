@@ -0,0 +1,103 @@
+import logging
+import time
+import typing
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def is_empty(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens < 1
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.burst
+
+    def consume(self, now: float):
+        self.refill(now)
+        self.tokens = max(0, self.tokens - 1)
+
+
+def client_address(remote: str, forwarded_for: typing.Optional[str], trusted_proxies: typing.Collection[str]) -> str:
+    '''Resolves the client address of a request which may have passed trusted reverse proxies'''
+    if remote not in trusted_proxies or forwarded_for is None:
+        return remote
+    # proxies append the address they received the request from, i.e. the rightmost untrusted one is the client
+    for address in reversed([address.strip() for address in forwarded_for.split(',')]):
+        if address not in trusted_proxies and len(address) > 0:
+            return address
+    return remote
+
+
+class RequestGuard:
+    '''Tracks unauthorized requests per remote, bans flooding remotes and aggregates rejections'''
+
+    def __init__(self, rate: float, burst: float, ban_duration: float):
+        self.logger = logging.getLogger('RequestGuard')
+        self.rate = rate
+        self.burst = burst
+        self.ban_duration = ban_duration
+        self.buckets: typing.Dict[str, TokenBucket] = {}
+        self.banned_until: typing.Dict[str, float] = {}
+        self.rejected_requests: typing.Dict[str, int] = {}
+
+    def is_banned(self, remote: str) -> bool:
+        '''Checks whether a request from the remote should be dropped without reading its body'''
+        if remote not in self.banned_until:
+            return False
+        if self.banned_until[remote] > time.monotonic():
+            self.record_rejected(remote)
+            return True
+        self.logger.info(f'Ban of {remote} expired')
+        del self.banned_until[remote]
+        return False
+
+    def record_unauthorized(self, remote: str) -> bool:
+        '''Records an unauthorized request and returns whether the remote exceeded its rate limit'''
+        now = time.monotonic()
+        self.record_rejected(remote)
+        if remote not in self.buckets:
+            self.buckets[remote] = TokenBucket(self.rate, self.burst)
+        bucket = self.buckets[remote]
+        if not bucket.is_empty(now):
+            bucket.consume(now)
+            return False
+        if self.ban_duration > 0:
+            self.logger.warning(f'Banning {remote} for {self.ban_duration} seconds')
+            self.banned_until[remote] = now + self.ban_duration
+        return True
+
+    def record_authorized(self, remote: str):
+        '''Refills the bucket of a remote which proved to be legitimate (e.g. shared with a scanner behind NAT)'''
+        self.buckets.pop(remote, None)
+
+    def record_rejected(self, remote: str):
+        self.rejected_requests[remote] = self.rejected_requests.get(remote, 0) + 1
+
+    def pop_summary(self) -> typing.Tuple[int, typing.List[str]]:
+        '''Returns the number of rejected requests and the rejected remotes (most rejections first) since the last call'''
+        rejected_requests = self.rejected_requests
+        self.rejected_requests = {}
+        self.prune()
+        remotes = sorted(rejected_requests, key=lambda remote: rejected_requests[remote], reverse=True)
+        return sum(rejected_requests.values()), remotes
+
+    def prune(self):
+        '''Forgets refilled buckets and expired bans s.t. memory stays bounded'''
+        now = time.monotonic()
+        self.buckets = {
+            remote: bucket for remote, bucket in self.buckets.items() if not bucket.is_full(now)
+        }
+        self.banned_until = {
+            remote: banned_until for remote, banned_until in self.banned_until.items() if banned_until > now
+        }
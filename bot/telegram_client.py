@@ -1,19 +1,25 @@
 import aiogram
 import asyncio
+import collections
+import copy
 import logging
 import traceback
 import typing
 import re
 
+from . import message_packing, tracing
+
 
 class TelegramClient:
 
-    def __init__(self, chat_id_discussions: str, chat_id_pushes: str, *args, **kwargs):
+    def __init__(self, chat_id_discussions: str, chat_id_pushes: str, packing_threshold: int, *args, **kwargs):
         self.chat_id_discussions = chat_id_discussions
         self.chat_id_pushes = chat_id_pushes
+        self.packing_threshold = packing_threshold
         self.logger = logging.getLogger('TelegramClient')
         self.bot = aiogram.Bot(*args, **kwargs)
         self.message_queue = asyncio.Queue()
+        self.pending_messages = collections.deque()
 
     async def __aenter__(self) -> 'TelegramClient':
         self.send_task = asyncio.create_task(self.send_runner())
@@ -26,51 +32,85 @@ class TelegramClient:
         except asyncio.CancelledError:
             pass
 
-        if not self.message_queue.empty():
-            self.logger.error(f'{self.message_queue.qsize()} unsent messages:')
+        self.take_queued_messages()
+        if len(self.pending_messages) > 0:
+            self.logger.error(f'{len(self.pending_messages)} unsent messages:')
+        for chat_id, message, message_kwargs, _ in self.pending_messages:
+            self.logger.error(f'Message \'{message}\' to chat {chat_id} with kwargs={message_kwargs}')
+
+        await self.bot.close()
+
+    def route(self, chat_id_discussions: str, chat_id_pushes: str) -> 'TelegramClient':
+        '''Creates a client sharing the bot and message queue which sends to other chats'''
+        routed = copy.copy(self)
+        routed.chat_id_discussions = chat_id_discussions
+        routed.chat_id_pushes = chat_id_pushes
+        return routed
+
+    def take_queued_messages(self):
         while True:
             try:
-                chat_id, message, message_kwargs = self.message_queue.get_nowait()
-                self.logger.error(f'Message \'{message}\' to chat {chat_id} with kwargs={message_kwargs}')
+                self.pending_messages.append(self.message_queue.get_nowait())
             except asyncio.QueueEmpty:
                 break
 
-        await self.bot.close()
-
     async def send_runner(self):
         try:
             while True:
-                chat_id, message, message_kwargs = await self.message_queue.get()
-                back_off_timeout = 6
-                while True:
-                    try:
-                        await self.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2', disable_web_page_preview=True, **message_kwargs)
-                        break
-                    except asyncio.CancelledError:
-                        return
-                    except Exception:
-                        self.logger.error(f'Failed to send message \'{message}\' to chat {chat_id} with kwargs={message_kwargs}')
-                        traceback.print_exc()
-                        self.logger.error(f'Sleeping for {back_off_timeout} seconds...')
-                        await asyncio.sleep(back_off_timeout)
-                        if back_off_timeout <= 120:
-                            back_off_timeout *= 2
-                        self.logger.error(f'Retrying...')
+                if len(self.pending_messages) == 0:
+                    self.pending_messages.append(await self.message_queue.get())
+                self.take_queued_messages()
+                # join backlogged messages of a chat to drain at Telegram's length limit instead of its message rate
+                batch = message_packing.take_batch(
+                    self.pending_messages,
+                    threshold=self.packing_threshold,
+                    max_length=4096,
+                    separator_length=2,
+                    destination_of=lambda item: (item[0], tuple(sorted(item[2].items()))),
+                    # Telegram counts UTF-16 code units
+                    length_of=lambda item: len(item[1].encode('utf-16-le')) // 2,
+                )
+                chat_id, _, message_kwargs, _ = batch[0]
+                message = '\n\n'.join(message for _, message, _, _ in batch)
+                with tracing.attach_all([detached_trace for _, _, _, detached_trace in batch], 'send telegram', chat_id=chat_id, packed_messages=len(batch)):
+                    back_off_timeout = 6
+                    attempts = 0
+                    while True:
+                        attempts += 1
+                        tracing.set_attribute('attempts', attempts)
+                        try:
+                            await self.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2', disable_web_page_preview=True, **message_kwargs)
+                            break
+                        except asyncio.CancelledError:
+                            return
+                        except Exception:
+                            self.logger.error(f'Failed to send message \'{message}\' to chat {chat_id} with kwargs={message_kwargs}')
+                            traceback.print_exc()
+                            self.logger.error(f'Sleeping for {back_off_timeout} seconds...')
+                            await asyncio.sleep(back_off_timeout)
+                            if back_off_timeout <= 120:
+                                back_off_timeout *= 2
+                            self.logger.error(f'Retrying...')
         except asyncio.CancelledError:
             pass
 
     async def send_to_discussions(self, message: str, **kwargs):
-        await self.message_queue.put((self.chat_id_discussions, message, kwargs))
+        with tracing.span('enqueue telegram', chat_id=self.chat_id_discussions):
+            await self.message_queue.put((self.chat_id_discussions, message, kwargs, tracing.detach()))
 
     async def send_to_pushes(self, message: str, **kwargs):
-        await self.message_queue.put((self.chat_id_pushes, message, kwargs))
+        with tracing.span('enqueue telegram', chat_id=self.chat_id_pushes):
+            await self.message_queue.put((self.chat_id_pushes, message, kwargs, tracing.detach()))
 
     async def send_startup(self):
         await self.send_to_discussions('\U0001f92b Online again', disable_notification=True)
         await self.send_to_pushes('\U0001f92b Online again', disable_notification=True)
 
-    async def send_unauthorized_request(self, remote: str):
-        await self.send_to_pushes(f'\U000026a0 Unauthorized request from `{self.escape(remote)}`', disable_notification=True)
+    async def send_unauthorized_requests_summary(self, rejected_requests: int, remotes: typing.List[str], period: str):
+        escaped_remotes = ', '.join([f'`{self.escape(remote)}`' for remote in remotes[:10]])
+        if len(remotes) > 10:
+            escaped_remotes += f', \\.\\.\\. {len(remotes) - 10} more'
+        await self.send_to_pushes(f'\U000026a0 {rejected_requests} rejected requests from {len(remotes)} IPs in the last {self.escape(period)}: {escaped_remotes}', disable_notification=True)
 
     async def send_create_webhook_of_repository(self, fork_owner: str, fork_repo: str):
         await self.send_to_pushes(f'\U00002705 Creating webhook at `{self.escape(fork_owner)}/{self.escape(fork_repo)}`\\.\\.\\.', disable_notification=True)
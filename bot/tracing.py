@@ -0,0 +1,230 @@
+import concurrent.futures
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import time
+import typing
+
+
+current_trace: contextvars.ContextVar[typing.Optional['Trace']] = contextvars.ContextVar(
+    'current_trace',
+    default=None,
+)
+current_span: contextvars.ContextVar[typing.Optional['Span']] = contextvars.ContextVar(
+    'current_span',
+    default=None,
+)
+
+
+class Span:
+
+    def __init__(self, name: str, parent: typing.Optional['Span'], attributes: dict, start_time: typing.Optional[int] = None):
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+        self.start_time = start_time if start_time is not None else time.time_ns()
+        self.end_time: typing.Optional[int] = None
+        self.error: typing.Optional[str] = None
+
+    def to_otlp(self, trace_id: str) -> dict:
+        '''Converts the span into the OTLP/JSON span representation'''
+        result = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            # SPAN_KIND_SERVER for the root span, SPAN_KIND_INTERNAL otherwise
+            'kind': 2 if self.parent is None else 1,
+            'startTimeUnixNano': str(self.start_time),
+            'endTimeUnixNano': str(self.end_time if self.end_time is not None else self.start_time),
+            'attributes': [
+                {'key': key, 'value': {'intValue': str(value)} if isinstance(value, int) else {'stringValue': str(value)}}
+                for key, value in self.attributes.items()
+            ],
+            # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+            'status': {'code': 2, 'message': self.error} if self.error is not None else {'code': 0},
+        }
+        if self.parent is not None:
+            result['parentSpanId'] = self.parent.span_id
+        return result
+
+
+class Trace:
+
+    def __init__(self, tracer: 'Tracer', delivery_id: typing.Optional[str], is_sampled: bool):
+        self.tracer = tracer
+        self.delivery_id = delivery_id
+        # GitHub delivery IDs are GUIDs, i.e. already valid 16 byte trace IDs
+        trace_id = delivery_id.replace('-', '').lower() if delivery_id is not None else ''
+        self.trace_id = trace_id if re.fullmatch(r'[0-9a-f]{32}', trace_id) else os.urandom(16).hex()
+        self.is_sampled = is_sampled
+        self.spans: typing.List[Span] = []
+        self.pending = 0
+
+    @contextlib.contextmanager
+    def span(self, name: str, start_time: typing.Optional[int] = None, **attributes):
+        span = Span(name, current_span.get(), attributes, start_time)
+        self.spans.append(span)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as exception:
+            span.error = type(exception).__name__
+            raise
+        finally:
+            span.end_time = time.time_ns()
+            current_span.reset(token)
+
+    def record_span(self, name: str, start_time: int, end_time: int, **attributes):
+        '''Records an already finished span'''
+        span = Span(name, current_span.get(), attributes, start_time)
+        span.end_time = end_time
+        self.spans.append(span)
+
+    def hold(self):
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self.tracer.finish(self)
+
+    def duration(self) -> float:
+        '''Seconds from the start of the root span until the last span ended'''
+        end_times = [span.end_time for span in self.spans if span.end_time is not None]
+        if len(self.spans) == 0 or len(end_times) == 0:
+            return 0
+        return (max(end_times) - self.spans[0].start_time) / 1e9
+
+
+class Tracer:
+    '''Traces webhook deliveries and exports sampled or slow traces as OTLP/JSON lines'''
+
+    def __init__(self, export_path: typing.Optional[str], sample_rate: float, slow_threshold: float):
+        self.logger = logging.getLogger('Tracer')
+        self.export_path = export_path
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        # a single thread keeps the export file off the event loop and its lines in order
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='Tracer')
+
+    def close(self):
+        '''Waits until all finished traces have been exported'''
+        self.executor.shutdown(wait=True)
+
+    @contextlib.contextmanager
+    def trace(self, name: str, delivery_id: typing.Optional[str], start_time: typing.Optional[int] = None, **attributes):
+        '''Starts a trace with its root span, the trace finishes when all detached work has been attached again'''
+        if self.export_path is None:
+            yield
+            return
+        trace = Trace(self, delivery_id, random.random() < self.sample_rate)
+        trace.hold()
+        token = current_trace.set(trace)
+        try:
+            with trace.span(name, start_time, **attributes):
+                yield
+        finally:
+            current_trace.reset(token)
+            trace.release()
+
+    def finish(self, trace: Trace):
+        duration = trace.duration()
+        is_slow = duration >= self.slow_threshold
+        if is_slow:
+            self.logger.warning(
+                f'Slow delivery {trace.delivery_id} took {duration:.3f} seconds: ' +
+                ', '.join(f'{span.name}={(span.end_time - span.start_time) / 1e9:.3f}s' for span in trace.spans if span.end_time is not None),
+            )
+        if not is_slow and not trace.is_sampled:
+            return
+        line = json.dumps({
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': [{'key': 'service.name', 'value': {'stringValue': 'github-notifications-bot'}}],
+                },
+                'scopeSpans': [{
+                    'scope': {'name': 'bot'},
+                    'spans': [span.to_otlp(trace.trace_id) for span in trace.spans],
+                }],
+            }],
+        })
+        self.executor.submit(self.export, trace.delivery_id, line)
+
+    def export(self, delivery_id: typing.Optional[str], line: str):
+        try:
+            with open(self.export_path, 'a') as export_file:
+                export_file.write(line + '\n')
+        except OSError:
+            self.logger.exception(f'Failed to export trace of delivery {delivery_id}')
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    '''Records a span in the current trace (if any)'''
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attributes):
+        yield
+
+
+def record_span(name: str, start_time: int, end_time: int, **attributes):
+    '''Records an already finished span in the current trace (if any)'''
+    trace = current_trace.get()
+    if trace is not None:
+        trace.record_span(name, start_time, end_time, **attributes)
+
+
+def set_attribute(key: str, value: typing.Union[str, int]):
+    '''Sets an attribute of the current span (if any)'''
+    span = current_span.get()
+    if span is not None:
+        span.attributes[key] = value
+
+
+Detached = typing.Tuple[Trace, typing.Optional[Span]]
+
+
+def detach() -> typing.Optional[Detached]:
+    '''Keeps the current trace open for work that continues in another task'''
+    trace = current_trace.get()
+    if trace is None:
+        return None
+    trace.hold()
+    return trace, current_span.get()
+
+
+@contextlib.contextmanager
+def attach(detached: typing.Optional[Detached]):
+    '''Continues a detached trace in the current task and releases it afterwards'''
+    if detached is None:
+        yield
+        return
+    trace, parent = detached
+    trace_token = current_trace.set(trace)
+    span_token = current_span.set(parent)
+    try:
+        yield
+    finally:
+        current_span.reset(span_token)
+        current_trace.reset(trace_token)
+        trace.release()
+
+
+@contextlib.contextmanager
+def attach_all(detached_traces: typing.List[typing.Optional[Detached]], name: str, **attributes):
+    '''Continues multiple detached traces with one span each (sharing their attributes), e.g. for packed messages'''
+    with contextlib.ExitStack() as stack:
+        for detached in detached_traces:
+            if detached is None:
+                continue
+            stack.enter_context(attach(detached))
+            span = stack.enter_context(detached[0].span(name))
+            span.attributes = attributes
+        yield
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+
+from bot.delivery_backfill import DeliveryBackfill
+
+
+def delivery(id: int, guid: str, status_code: int, redelivery: bool = False) -> dict:
+    return {
+        'id': id,
+        'guid': guid,
+        'status_code': status_code,
+        'redelivery': redelivery,
+        'delivered_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+class FakeGitHubApi:
+
+    def __init__(self, deliveries: list, failing_redeliveries: set = set()):
+        self.deliveries = deliveries
+        self.failing_redeliveries = failing_redeliveries
+        self.hook_deliveries_calls = []
+        self.redelivered = []
+
+    async def hook_deliveries(self, hook_id, owner_or_org, repo=None, after_delivery_id=None, not_before=None):
+        self.hook_deliveries_calls.append((hook_id, owner_or_org, repo, after_delivery_id))
+        return [delivery for delivery in self.deliveries if after_delivery_id is None or delivery['id'] > after_delivery_id]
+
+    async def redeliver(self, hook_id, delivery_id, owner_or_org, repo=None):
+        if delivery_id in self.failing_redeliveries:
+            raise RuntimeError('redelivery failed')
+        self.redelivered.append((hook_id, delivery_id, owner_or_org, repo))
+
+
+def backfill(github: FakeGitHubApi, state_path=None, delivery_backfill=None, **kwargs) -> DeliveryBackfill:
+    if delivery_backfill is None:
+        delivery_backfill = DeliveryBackfill(state_path=state_path, max_age=3600, concurrency=2)
+    asyncio.run(delivery_backfill.backfill(github, 1, 'org', **kwargs))
+    return delivery_backfill
+
+
+def test_redelivers_latest_failed_attempt_per_guid():
+    # newest first, like the GitHub API
+    github = FakeGitHubApi([
+        delivery(6, 'c', 0),
+        delivery(5, 'b', 502),
+        delivery(4, 'a', 200, redelivery=True),
+        delivery(3, 'b', 0),
+        delivery(2, 'a', 0),
+        delivery(1, 'd', 204),
+    ])
+    delivery_backfill = backfill(github)
+    assert sorted(github.redelivered) == [(1, 5, 'org', None), (1, 6, 'org', None)]
+    assert delivery_backfill.high_water_marks == {'org/1': 6}
+
+
+def test_failed_redeliveries_are_not_redelivered_again():
+    github = FakeGitHubApi([
+        delivery(2, 'a', 500, redelivery=True),
+        delivery(1, 'a', 0),
+    ])
+    backfill(github)
+    assert github.redelivered == []
+
+
+def test_only_failed_redelivery_requests_are_retried():
+    github = FakeGitHubApi([
+        delivery(9, 'c', 200),
+        delivery(8, 'b', 0),
+        delivery(7, 'a', 0),
+    ], failing_redeliveries={7})
+    delivery_backfill = backfill(github)
+    assert github.redelivered == [(1, 8, 'org', None)]
+    assert delivery_backfill.high_water_marks == {'org/1': 9}
+    assert [failed['id'] for failed in delivery_backfill.failed_redeliveries['org/1']] == [7]
+
+    # GitHub has not recorded the accepted redelivery of 8 yet, it must not be sent twice
+    github.failing_redeliveries = set()
+    github.redelivered = []
+    backfill(github, delivery_backfill=delivery_backfill)
+    assert github.hook_deliveries_calls[-1] == (1, 'org', None, 9)
+    assert github.redelivered == [(1, 7, 'org', None)]
+    assert delivery_backfill.high_water_marks == {'org/1': 9}
+    assert delivery_backfill.failed_redeliveries == {}
+
+
+def test_retries_are_dropped_once_delivered_or_too_old():
+    github = FakeGitHubApi([delivery(2, 'b', 0), delivery(1, 'a', 0)], failing_redeliveries={1, 2})
+    delivery_backfill = backfill(github)
+    delivery_backfill.failed_redeliveries['org/1'][1]['delivered_at'] = '2000-01-01T00:00:00Z'
+
+    github.deliveries.insert(0, delivery(3, 'b', 200, redelivery=True))
+    github.failing_redeliveries = set()
+    backfill(github, delivery_backfill=delivery_backfill)
+    assert github.redelivered == []
+    assert delivery_backfill.failed_redeliveries == {}
+
+
+def test_scan_is_incremental_across_restarts(tmp_path):
+    state_path = str(tmp_path / 'deliveries.json')
+    github = FakeGitHubApi([delivery(2, 'b', 0), delivery(1, 'a', 200)])
+    backfill(github, state_path, repo='fork')
+    with open(state_path) as state_file:
+        assert json.load(state_file) == {'high_water_marks': {'org/fork/1': 2}, 'failed_redeliveries': {}}
+
+    github.deliveries.insert(0, delivery(3, 'c', 0))
+    github.redelivered = []
+    backfill(github, state_path, repo='fork')
+    assert github.hook_deliveries_calls[-1] == (1, 'org', 'fork', 2)
+    assert github.redelivered == [(1, 3, 'org', 'fork')]
+
+
+def test_nothing_to_scan_keeps_state():
+    github = FakeGitHubApi([])
+    delivery_backfill = backfill(github)
+    assert github.redelivered == []
+    assert delivery_backfill.high_water_marks == {}
@@ -0,0 +1,51 @@
+import aiohttp.test_utils
+import aiohttp.web
+import asyncio
+import pytest
+
+from bot.github_api import GitHubApi, UnexpectedResponseStatus
+
+
+def run_against(responses: list, method: str, expected_status: int):
+    '''Sends a rate limited request to a server answering with the given (status, headers) in order'''
+    requests = []
+
+    async def handler(request: aiohttp.web.Request):
+        requests.append(request.method)
+        status, headers = responses[len(requests) - 1]
+        return aiohttp.web.json_response([{'id': 1}], status=status, headers=headers)
+
+    async def run():
+        app = aiohttp.web.Application()
+        app.router.add_route('*', '/', handler)
+        async with aiohttp.test_utils.TestServer(app) as server:
+            async with GitHubApi('token') as github:
+                return await github.rate_limited_request(method, str(server.make_url('/')), expected_status)
+
+    return asyncio.run(run()), requests
+
+
+def test_rate_limited_request_is_retried_after_reset():
+    result, requests = run_against([
+        (403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0'}),
+        (200, {'Link': '<https://api.github.com/next>; rel="next"'}),
+    ], 'GET', 200)
+    assert requests == ['GET', 'GET']
+    assert result == ([{'id': 1}], '<https://api.github.com/next>; rel="next"')
+
+
+def test_secondary_rate_limit_is_retried_after_retry_after():
+    result, requests = run_against([(429, {'Retry-After': '0'}), (202, {})], 'POST', 202)
+    assert requests == ['POST', 'POST']
+    assert result == (None, None)
+
+
+def test_rate_limited_request_is_retried_only_once():
+    with pytest.raises(UnexpectedResponseStatus):
+        run_against([(429, {'Retry-After': '0'}), (429, {'Retry-After': '0'})], 'POST', 202)
+
+
+def test_other_errors_are_not_retried():
+    with pytest.raises(UnexpectedResponseStatus) as error:
+        run_against([(404, {})], 'GET', 200)
+    assert error.value.got == 404
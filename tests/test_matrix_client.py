@@ -0,0 +1,96 @@
+import asyncio
+import json
+import nio
+
+from bot.matrix_client import MatrixClient
+
+
+def send_all(responses: list, messages: list) -> list:
+    '''Drains the messages through the send runner whose room_send answers with the given responses (or raises them) in order'''
+    sent_contents = []
+
+    async def room_send(room_id: str, message_type: str, content: dict, ignore_unverified_devices: bool):
+        sent_contents.append(content['body'])
+        response = responses[len(sent_contents) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def run():
+        matrix = MatrixClient('@bot:example.com', 'token', '!discussions:example.com', '!pushes:example.com', len(messages) + 1, homeserver='https://matrix.example.com', store_path='')
+        matrix.client.room_send = room_send
+        for message in messages:
+            await matrix.send_to_pushes(message, message)
+        send_task = asyncio.create_task(matrix.send_runner())
+        while not matrix.message_queue.empty() or len(matrix.pending_messages) > 0 or len(sent_contents) < len(responses):
+            await asyncio.sleep(0.001)
+        send_task.cancel()
+        await send_task
+        await matrix.client.close()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+    return sent_contents
+
+
+def test_permanent_errors_drop_the_message():
+    sent_contents = send_all([
+        nio.LocalProtocolError('No such room with id !pushes:example.com found.'),
+        nio.RoomSendError('Forbidden', 'M_FORBIDDEN'),
+        nio.RoomSendError('Event too large', 'M_TOO_LARGE'),
+        nio.RoomSendResponse('$event', '!pushes:example.com'),
+    ], ['1', '2', '3', '4'])
+    assert sent_contents == ['1', '2', '3', '4']
+
+
+def test_rate_limited_message_is_retried():
+    sent_contents = send_all([
+        nio.RoomSendError('Too many requests', 'M_LIMIT_EXCEEDED', retry_after_ms=0),
+        nio.RoomSendResponse('$event', '!pushes:example.com'),
+        nio.RoomSendResponse('$event', '!pushes:example.com'),
+    ], ['1', '2'])
+    assert sent_contents == ['1', '1', '2']
+
+
+def pack_all(messages: list, is_encrypted: bool) -> list:
+    '''Drains the backlogged messages through the send runner and returns the sent event contents'''
+    sent_contents = []
+
+    async def room_send(room_id: str, message_type: str, content: dict, ignore_unverified_devices: bool):
+        sent_contents.append(content)
+        return nio.RoomSendResponse('$event', room_id)
+
+    async def run():
+        matrix = MatrixClient('@bot:example.com', 'token', '!discussions:example.com', '!pushes:example.com', 2, homeserver='https://matrix.example.com', store_path='')
+        matrix.client.room_send = room_send
+        room = nio.MatrixRoom('!pushes:example.com', '@bot:example.com')
+        room.encrypted = is_encrypted
+        matrix.client.rooms[room.room_id] = room
+        for message in messages:
+            await matrix.send_to_pushes(message, message)
+        send_task = asyncio.create_task(matrix.send_runner())
+        while not matrix.message_queue.empty() or len(matrix.pending_messages) > 0:
+            await asyncio.sleep(0.001)
+        send_task.cancel()
+        await send_task
+        await matrix.client.close()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+    return sent_contents
+
+
+# emojis and CJK characters are escaped to \uXXXX by nio's JSON encoding, quotes and newlines are escaped as well
+WORST_CASE_MESSAGES = ['\U0001f600漢字"\n' * 50 for _ in range(500)]
+
+
+def test_packed_encrypted_content_stays_below_event_limit():
+    sent_contents = pack_all(WORST_CASE_MESSAGES, is_encrypted=True)
+    assert len(sent_contents) < len(WORST_CASE_MESSAGES)
+    for content in sent_contents:
+        assert len(json.dumps(content)) * 4 / 3 < 56 * 1024
+
+
+def test_packed_content_stays_below_event_limit():
+    sent_contents = pack_all(WORST_CASE_MESSAGES, is_encrypted=False)
+    assert len(sent_contents) < len(WORST_CASE_MESSAGES)
+    for content in sent_contents:
+        assert len(json.dumps(content)) < 56 * 1024
@@ -0,0 +1,56 @@
+import collections
+
+from bot.message_packing import take_batch
+
+
+def take_all(pending: collections.deque, threshold: int = 3, max_length: int = 4096) -> list:
+    batches = []
+    while len(pending) > 0:
+        batch = take_batch(
+            pending,
+            threshold=threshold,
+            max_length=max_length,
+            separator_length=2,
+            destination_of=lambda item: (item[0], item[2]),
+            length_of=lambda item: len(item[1]),
+        )
+        batches.append([message for _, message, _ in batch])
+    return batches
+
+
+def test_no_packing_below_threshold():
+    pending = collections.deque([('a', '1', None), ('a', '2', None), ('b', '3', None)])
+    assert take_all(pending) == [['1'], ['2'], ['3']]
+
+
+def test_backlogged_destination_is_packed_in_order():
+    pending = collections.deque([
+        ('a', '1', None),
+        ('b', 'x', None),
+        ('a', '2', None),
+        ('a', '3', None),
+        ('b', 'y', None),
+    ])
+    assert take_all(pending) == [['1', '2', '3'], ['x'], ['y']]
+
+
+def test_packing_stops_at_different_options():
+    pending = collections.deque([
+        ('a', '1', None),
+        ('a', '2', None),
+        ('a', '3', 'silent'),
+        ('a', '4', None),
+    ])
+    # '4' must not overtake '3'
+    assert take_all(pending) == [['1', '2'], ['3'], ['4']]
+
+
+def test_packing_respects_max_length():
+    pending = collections.deque([('a', 'x' * 4, None) for _ in range(5)])
+    # 4 + 2 + 4 = 10 fits, a third message would need 16
+    assert take_all(pending, max_length=10) == [['xxxx', 'xxxx'], ['xxxx', 'xxxx'], ['xxxx']]
+
+
+def test_oversized_message_is_sent_alone():
+    pending = collections.deque([('a', 'x' * 20, None), ('a', '1', None), ('a', '2', None)])
+    assert take_all(pending, max_length=10) == [['x' * 20], ['1'], ['2']]
@@ -0,0 +1,171 @@
+import aiohttp.web
+import asyncio
+import click.testing
+import json
+import pytest
+
+from bot.main import Bot, main
+from bot.organization import load_configurations
+
+
+ARGUMENTS = {
+    'github_webhook_secret': 'secret',
+    'github_webhook_url': 'https://bot.example.com/',
+    'github_access_token': None,
+    'github_organization': None,
+    'github_forkable_repositories': None,
+    'github_backfill_state_path': None,
+    'github_backfill_max_age': 3600,
+    'github_backfill_concurrency': 1,
+    'github_backfill_interval': 3600,
+    'telegram_bot_token': '123456:test',
+    'telegram_chat_id_discussions': '-1',
+    'telegram_chat_id_pushes': '-2',
+    'matrix_homeserver': 'https://matrix.example.com',
+    'matrix_user_id': '@bot:example.com',
+    'matrix_device_id': 'DEVICE',
+    'matrix_access_token': 'token',
+    'matrix_store_path': '',
+    'matrix_room_id_discussions': '!discussions:example.com',
+    'matrix_room_id_pushes': '!pushes:example.com',
+    'message_packing_threshold': 3,
+    'trusted_proxies': '',
+    'unauthorized_requests_rate': 1,
+    'unauthorized_requests_burst': 1,
+    'unauthorized_requests_ban_duration': 0,
+    'tracing_export_path': None,
+    'tracing_sample_rate': 0,
+    'tracing_slow_threshold': 10,
+}
+
+
+class FakeGitHubApi:
+
+    def __init__(self, forks: list, hooks: dict):
+        self.fork_list = forks
+        self.hook_lists = hooks
+        self.created_hooks = []
+        self.deleted_hooks = []
+
+    async def forks(self, owner, repo):
+        return self.fork_list
+
+    async def hooks(self, owner_or_org, repo=None):
+        return self.hook_lists.get(f'{owner_or_org}/{repo}' if repo is not None else owner_or_org, [])
+
+    async def create_hook(self, url, events, secret, owner_or_org, repo=None):
+        self.created_hooks.append(f'{owner_or_org}/{repo}' if repo is not None else owner_or_org)
+        return len(self.created_hooks)
+
+    async def delete_hook(self, hook_id, owner_or_org, repo=None):
+        self.deleted_hooks.append((hook_id, f'{owner_or_org}/{repo}' if repo is not None else owner_or_org))
+
+
+class FakeMessenger:
+
+    async def send_create_webhook_of_organization(self, *args):
+        pass
+
+    async def send_create_webhook_of_repository(self, *args):
+        pass
+
+
+@pytest.fixture
+def make_bot(tmp_path):
+
+    def make_bot(organizations: list) -> Bot:
+        config_path = tmp_path / 'organizations.json'
+        config_path.write_text(json.dumps(organizations))
+        return Bot({**ARGUMENTS, 'github_organizations_config': str(config_path)}, aiohttp.web.Application())
+
+    return make_bot
+
+
+def test_events_resolve_to_their_organization(make_bot):
+    async def test():
+        bot = make_bot([
+            {'organization': 'Alpha', 'access_token': 'a', 'forkable_repositories': ['repo']},
+            {'organization': 'beta', 'access_token': 'b', 'forkable_repositories': []},
+        ])
+        alpha, beta = bot.organizations
+        alpha.forks.add('someone/repo')
+        assert bot.resolve_organization({'organization': {'login': 'alpha'}}) is alpha
+        assert bot.resolve_organization({'repository': {'full_name': 'beta/x', 'owner': {'login': 'Beta'}}}) is beta
+        assert bot.resolve_organization({'repository': {'full_name': 'Someone/repo', 'owner': {'login': 'Someone'}}}) is alpha
+        assert bot.resolve_organization({'repository': {'full_name': 'other/repo', 'owner': {'login': 'other'}}}) is None
+        for organization in bot.organizations:
+            await organization.github.session.close()
+
+    asyncio.run(test())
+
+
+def test_unknown_organization_is_resolved_to_the_only_one(make_bot):
+    async def test():
+        bot = make_bot([{'organization': 'alpha', 'access_token': 'a', 'forkable_repositories': []}])
+        assert bot.resolve_organization({'repository': {'full_name': 'other/repo', 'owner': {'login': 'other'}}}) is bot.organizations[0]
+        await bot.organizations[0].github.session.close()
+
+    asyncio.run(test())
+
+
+def test_update_hooks_skips_forks_of_configured_organizations(make_bot):
+    async def test():
+        bot = make_bot([
+            {'organization': 'alpha', 'access_token': 'a', 'forkable_repositories': ['repo']},
+            {'organization': 'beta', 'access_token': 'b', 'forkable_repositories': []},
+        ])
+        alpha = bot.organizations[0]
+        await alpha.github.session.close()
+        await bot.organizations[1].github.session.close()
+        alpha.github = FakeGitHubApi(
+            forks=[('someone', 'repo'), ('Beta', 'repo'), ('alpha', 'repo-copy')],
+            hooks={
+                'alpha': [(1, 'https://bot.example.com/', ['push', 'issues', 'pull_request', 'issue_comment', 'pull_request_review_comment', 'pull_request_review', 'fork'])],
+                'Beta/repo': [(2, 'https://bot.example.com/', ['push']), (3, 'https://other.example.com/', ['push'])],
+            },
+        )
+        alpha.telegram = FakeMessenger()
+        alpha.matrix = FakeMessenger()
+        await bot.update_hooks_of(alpha)
+        assert alpha.github.created_hooks == ['someone/repo']
+        assert alpha.github.deleted_hooks == [(2, 'Beta/repo')]
+        assert alpha.forks == {'someone/repo'}
+        assert alpha.managed_hooks == [(1, 'alpha', None), (1, 'someone', 'repo')]
+
+    asyncio.run(test())
+
+
+def load(tmp_path, organizations) -> list:
+    config_path = tmp_path / 'organizations.json'
+    config_path.write_text(json.dumps(organizations))
+    return load_configurations({'github_organizations_config': str(config_path)})
+
+
+def test_valid_configuration_is_loaded(tmp_path):
+    organizations = [{'organization': 'alpha', 'access_token': 'a', 'forkable_repositories': ['repo'], 'telegram_chat_id_pushes': -123}]
+    assert load(tmp_path, organizations) == organizations
+
+
+@pytest.mark.parametrize('organizations, message', [
+    ([], 'non-empty list'),
+    ([{'access_token': 'a', 'forkable_repositories': []}], '#0 needs a non-empty string organization'),
+    ([{'organization': 'alpha', 'forkable_repositories': []}], 'alpha needs a non-empty string access_token'),
+    ([{'organization': 'alpha', 'access_token': 'a', 'forkable_repositories': 'repo,other'}], 'alpha needs forkable_repositories as list of strings'),
+    ([{'organization': 'alpha', 'access_token': 'a', 'forkable_repositories': [], 'matrix_room_id_pushes': 1}], 'alpha needs matrix_room_id_pushes as string'),
+])
+def test_invalid_configuration_is_rejected(tmp_path, organizations, message):
+    with pytest.raises(ValueError, match=message):
+        load(tmp_path, organizations)
+
+
+def test_single_organization_options_cannot_be_combined_with_config(tmp_path):
+    config_path = tmp_path / 'organizations.json'
+    config_path.write_text(json.dumps([{'organization': 'alpha', 'access_token': 'a', 'forkable_repositories': []}]))
+    arguments = []
+    for key, value in ARGUMENTS.items():
+        if value is not None and key.startswith(('github_webhook', 'telegram', 'matrix')):
+            arguments += ['--' + key.replace('_', '-'), str(value)]
+    arguments += ['--github-webhook-host', '*', '--github-webhook-port', '80', '--logging-level', 'INFO', '--github-organizations-config', str(config_path)]
+    result = click.testing.CliRunner().invoke(main, arguments + ['--github-organization', 'beta'])
+    assert result.exit_code == 2
+    assert "'--github-organization' cannot be combined with '--github-organizations-config'" in result.output
@@ -0,0 +1,88 @@
+import pytest
+
+from bot import request_guard
+from bot.request_guard import RequestGuard, client_address
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(request_guard.time, 'monotonic', clock)
+    return clock
+
+
+def test_unauthorized_requests_are_limited_after_burst(clock):
+    guard = RequestGuard(rate=1, burst=3, ban_duration=0)
+    assert [guard.record_unauthorized('1.2.3.4') for _ in range(4)] == [False, False, False, True]
+    # other remotes have their own bucket
+    assert guard.record_unauthorized('5.6.7.8') is False
+    clock.now += 1
+    assert guard.record_unauthorized('1.2.3.4') is False
+    assert guard.record_unauthorized('1.2.3.4') is True
+
+
+def test_authorized_request_refills_bucket(clock):
+    guard = RequestGuard(rate=0, burst=1, ban_duration=0)
+    guard.record_unauthorized('1.2.3.4')
+    assert guard.record_unauthorized('1.2.3.4') is True
+    guard.record_authorized('1.2.3.4')
+    assert guard.record_unauthorized('1.2.3.4') is False
+
+
+def test_limited_remote_is_banned_until_ban_expires(clock):
+    guard = RequestGuard(rate=0, burst=1, ban_duration=60)
+    guard.record_unauthorized('1.2.3.4')
+    assert guard.is_banned('1.2.3.4') is False
+    guard.record_unauthorized('1.2.3.4')
+    assert guard.is_banned('1.2.3.4') is True
+    assert guard.is_banned('5.6.7.8') is False
+    clock.now += 61
+    assert guard.is_banned('1.2.3.4') is False
+
+
+def test_no_ban_without_ban_duration(clock):
+    guard = RequestGuard(rate=0, burst=1, ban_duration=0)
+    for _ in range(3):
+        guard.record_unauthorized('1.2.3.4')
+    assert guard.is_banned('1.2.3.4') is False
+
+
+def test_summary_counts_rejections_and_resets(clock):
+    guard = RequestGuard(rate=0, burst=1, ban_duration=60)
+    guard.record_unauthorized('5.6.7.8')
+    for _ in range(2):
+        guard.record_unauthorized('1.2.3.4')
+    guard.is_banned('1.2.3.4')
+    assert guard.pop_summary() == (4, ['1.2.3.4', '5.6.7.8'])
+    assert guard.pop_summary() == (0, [])
+
+
+def test_prune_forgets_refilled_buckets(clock):
+    guard = RequestGuard(rate=1, burst=2, ban_duration=0)
+    guard.record_unauthorized('1.2.3.4')
+    clock.now += 1
+    guard.prune()
+    assert guard.buckets == {}
+
+
+@pytest.mark.parametrize('remote, forwarded_for, expected', [
+    ('1.2.3.4', None, '1.2.3.4'),
+    # untrusted remotes may not spoof their address
+    ('1.2.3.4', '9.9.9.9', '1.2.3.4'),
+    ('10.0.0.1', None, '10.0.0.1'),
+    ('10.0.0.1', '9.9.9.9', '9.9.9.9'),
+    ('10.0.0.1', '6.6.6.6, 9.9.9.9', '9.9.9.9'),
+    ('10.0.0.1', '6.6.6.6, 9.9.9.9, 10.0.0.2', '9.9.9.9'),
+    ('10.0.0.1', '10.0.0.2', '10.0.0.1'),
+])
+def test_client_address(remote, forwarded_for, expected):
+    assert client_address(remote, forwarded_for, {'10.0.0.1', '10.0.0.2'}) == expected
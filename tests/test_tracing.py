@@ -0,0 +1,69 @@
+import asyncio
+import json
+import time
+
+from bot import tracing
+
+
+def exported_spans(path) -> list:
+    with open(path) as export_file:
+        return [
+            json.loads(line)['resourceSpans'][0]['scopeSpans'][0]['spans'] for line in export_file
+        ]
+
+
+def test_trace_is_exported_after_detached_work(tmp_path):
+    tracer = tracing.Tracer(str(tmp_path / 'traces.jsonl'), sample_rate=1, slow_threshold=10)
+
+    async def run():
+        queue = asyncio.Queue()
+
+        async def runner():
+            detached_trace = await queue.get()
+            with tracing.attach_all([detached_trace], 'send', attempts=1):
+                pass
+
+        task = asyncio.create_task(runner())
+        received_at = time.time_ns()
+        with tracer.trace('webhook', '72d3162e-cc78-11e3-81ab-4c9367dc0958', start_time=received_at, event='push'):
+            tracing.record_span('receive', received_at, time.time_ns())
+            with tracing.span('enqueue'):
+                await queue.put(tracing.detach())
+        await task
+
+    asyncio.run(run())
+    tracer.close()
+
+    [spans] = exported_spans(tmp_path / 'traces.jsonl')
+    assert [span['name'] for span in spans] == ['webhook', 'receive', 'enqueue', 'send']
+    assert all(span['traceId'] == '72d3162ecc7811e381ab4c9367dc0958' for span in spans)
+    webhook, receive, enqueue, send = spans
+    assert webhook['startTimeUnixNano'] == receive['startTimeUnixNano']
+    assert 'parentSpanId' not in webhook
+    assert receive['parentSpanId'] == webhook['spanId']
+    assert enqueue['parentSpanId'] == webhook['spanId']
+    assert send['parentSpanId'] == enqueue['spanId']
+    assert send['attributes'] == [{'key': 'attempts', 'value': {'intValue': '1'}}]
+
+
+def test_only_sampled_or_slow_traces_are_exported(tmp_path):
+    tracer = tracing.Tracer(str(tmp_path / 'traces.jsonl'), sample_rate=0, slow_threshold=0.05)
+    with tracer.trace('webhook', 'fast', delivery='fast'):
+        pass
+    with tracer.trace('webhook', 'slow', delivery='slow'):
+        time.sleep(0.06)
+    tracer.close()
+
+    [spans] = exported_spans(tmp_path / 'traces.jsonl')
+    assert spans[0]['attributes'] == [{'key': 'delivery', 'value': {'stringValue': 'slow'}}]
+    assert int(spans[0]['endTimeUnixNano']) - int(spans[0]['startTimeUnixNano']) >= 50_000_000
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = tracing.Tracer(None, sample_rate=1, slow_threshold=0)
+    with tracer.trace('webhook', 'delivery'):
+        assert tracing.current_trace.get() is None
+        assert tracing.detach() is None
+        with tracing.span('decode'):
+            pass
+    tracer.close()